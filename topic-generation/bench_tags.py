@@ -0,0 +1,552 @@
+#!/usr/bin/env -S uv run --script
+# /// script
+# requires-python = ">=3.7"
+# dependencies = [
+#     "requests>=2.31.0",
+#     "urllib3>=2.0.0",
+# ]
+# ///
+"""
+Trail Tag Generator Benchmark
+
+Measures end-to-end throughput of generate_tags.py without real LLM calls
+or the production API.
+
+Features:
+- Fake `opencode` executable put on PATH: log-normal latency, configurable
+  failure rate and output noise (ANSI codes, echoed prompt with its example
+  output), answers both single-entry and batch prompts
+- Local stand-in for the Trail API serving /api/entries (cursor pagination),
+  /api/tags, /api/profile and PUT /api/entries/{id}/tags, optional latency
+- Runs generate_tags.py once per --concurrency x --batch-size combination,
+  each with a fresh state store
+- Reports entries/min, CPU time of the tagger (fake opencode processes
+  excluded), CPU per entry and peak RSS
+- --output saves results with the current git commit; --compare prints the
+  change against a saved run, so performance can be compared across commits
+
+Usage:
+    uv run bench_tags.py [--entries N] [--concurrency 1,4,8] [--batch-size 1,5]
+    uv run bench_tags.py --output before.json
+    uv run bench_tags.py --compare before.json --tagger-args "--delay-ms 0"
+"""
+
+import argparse
+import json
+import os
+import re
+import shlex
+import shutil
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from datetime import datetime, timedelta
+from http.server import BaseHTTPRequestHandler, HTTPServer
+from pathlib import Path
+from socketserver import ThreadingMixIn
+from typing import Dict, List, Optional
+from urllib.parse import parse_qs, urlparse
+
+# Constants
+GENERATE_TAGS = Path(__file__).parent / "generate_tags.py"
+DEFAULT_ENTRIES = 200
+DEFAULT_CONCURRENCY = "1,4,8"
+DEFAULT_BATCH_SIZE = "1,5"
+DEFAULT_LATENCY = 0.5  # median seconds per fake opencode call
+DEFAULT_LATENCY_SIGMA = 0.5  # log-normal shape; 0 makes every call take the median
+DEFAULT_FAILURE_RATE = 0.02
+DEFAULT_RUN_TIMEOUT = 900  # seconds per configuration
+MAX_FAKE_LATENCY = 30.0
+TAG_POOL = [
+    "python", "rust", "javascript", "machine-learning", "databases", "performance",
+    "security", "devops", "tutorial", "open-source", "web-development", "testing",
+]
+WORDS = (
+    "async runtime kernel compiler cache query index vector model browser "
+    "cluster latency profiler memory garbage collector parser network stream"
+).split()
+
+FAKE_OPENCODE = '''#!{python}
+"""Fake opencode for bench_tags.py: sleeps, answers in the expected format."""
+import hashlib, json, math, os, random, re, resource, sys, time
+
+prompt = sys.argv[-1]
+median = float(os.environ.get("BENCH_LATENCY", "0.5"))
+sigma = float(os.environ.get("BENCH_LATENCY_SIGMA", "0.5"))
+failed = random.random() < float(os.environ.get("BENCH_FAILURE_RATE", "0"))
+noise = os.environ.get("BENCH_NOISE") == "1"
+pool = json.loads(os.environ["BENCH_TAG_POOL"])
+
+latency = random.lognormvariate(math.log(median), sigma) if median > 0 and sigma > 0 else median
+time.sleep(min(latency, float(os.environ.get("BENCH_MAX_LATENCY", "30"))))
+
+def tags(key):
+    digest = hashlib.sha256(key.encode()).digest()
+    return sorted({{pool[b % len(pool)] for b in digest[:4]}})
+
+ids = re.findall(r"^=== ENTRY (\\S+) ===$", prompt, re.M)
+
+# Log before answering: the tagger kills the process once a complete answer is printed
+usage = resource.getrusage(resource.RUSAGE_SELF)
+with open(os.environ["BENCH_CALL_LOG"], "a") as f:
+    f.write(json.dumps({{"cpu": usage.ru_utime + usage.ru_stime, "ok": not failed, "entries": len(ids) or 1}}) + "\\n")
+
+if not failed:
+    if noise:
+        print("\\x1b[0m\\x1b[1m> tag-generator\\x1b[0m \\x1b[2mthinking\\x1b[0m")
+        print(prompt)
+    if ids:
+        print(json.dumps({{hid: tags(hid) for hid in ids}}))
+    else:
+        print(json.dumps(tags(prompt)))
+    if noise:
+        print("\\x1b[2mdone\\x1b[0m")
+else:
+    print("Error: provider unavailable", file=sys.stderr)
+sys.exit(1 if failed else 0)
+'''
+
+
+class ThreadingHTTPServer(ThreadingMixIn, HTTPServer):
+    daemon_threads = True
+
+
+class StandInAPI:
+    """
+    In-process stand-in for the Trail API.
+
+    Serves synthetic untagged entries newest-first with the same cursor
+    pagination as the real API and records tag writes.
+    """
+
+    def __init__(self, entries: int, latency_ms: float = 0.0):
+        self.count = entries
+        self.latency = latency_ms / 1000.0
+        self.lock = threading.Lock()
+        self.entries: List[Dict] = []
+        self.tagged: Dict[str, List[str]] = {}
+        self.requests = 0
+        self.reset()
+
+        api = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def log_message(self, *args):
+                pass
+
+            def _send(self, status: int, body: Dict) -> None:
+                data = json.dumps(body).encode()
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            def do_GET(self):
+                api._delay()
+                url = urlparse(self.path)
+                query = parse_qs(url.query)
+                if url.path == "/api/entries":
+                    limit = int(query.get("limit", ["100"])[0])
+                    before = query.get("before", [None])[0]
+                    self._send(200, api.page(limit, before))
+                elif url.path == "/api/tags":
+                    self._send(200, {"tags": [{"name": tag, "slug": tag} for tag in TAG_POOL]})
+                elif url.path == "/api/profile":
+                    self._send(200, {"id": 1, "nickname": "bench", "is_admin": True})
+                else:
+                    self._send(404, {"error": "Not found"})
+
+            def do_PUT(self):
+                api._delay()
+                length = int(self.headers.get("Content-Length", 0))
+                body = json.loads(self.rfile.read(length) or b"{}")
+                match = re.match(r"^/api/entries/([^/]+)/tags$", urlparse(self.path).path)
+                if not match:
+                    return self._send(404, {"error": "Not found"})
+                with api.lock:
+                    api.tagged[match.group(1)] = body.get("tags", [])
+                self._send(200, {"tags": body.get("tags", [])})
+
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.url = f"http://127.0.0.1:{self.server.server_address[1]}/api"
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+
+    def reset(self) -> None:
+        """Fresh, untagged corpus for the next configuration."""
+        start = datetime(2025, 1, 1)
+        entries = []
+        for i in range(self.count, 0, -1):
+            words = " ".join(WORDS[(i * k) % len(WORDS)] for k in (1, 3, 7, 11))
+            entries.append({
+                "id": i,
+                "hash_id": f"bench{i:06d}",
+                "user_id": 1,
+                "text": f"Notes on {words} #{i} https://example.com/posts/{i}",
+                "preview_url": f"https://example.com/posts/{i}",
+                "preview_title": f"Post {i}: {words}",
+                "preview_description": f"A write-up about {words}.",
+                "preview_site_name": "example.com",
+                "tags": [],
+                "created_at": (start + timedelta(minutes=i)).strftime("%Y-%m-%d %H:%M:%S"),
+                "clap_count": i % 13,
+                "view_count": i * 7 % 500,
+                "comment_count": i % 5,
+            })
+        with self.lock:
+            self.entries = entries
+            self.tagged = {}
+            self.requests = 0
+
+    def page(self, limit: int, before: Optional[str]) -> Dict:
+        with self.lock:
+            items = [e for e in self.entries if before is None or e["created_at"] < before][:limit]
+        return {
+            "entries": items,
+            "has_more": len(items) == limit,
+            "next_cursor": items[-1]["created_at"] if items else None,
+        }
+
+    def _delay(self) -> None:
+        with self.lock:
+            self.requests += 1
+        if self.latency:
+            time.sleep(self.latency)
+
+    def start(self) -> None:
+        self.thread.start()
+
+    def stop(self) -> None:
+        self.server.shutdown()
+        self.server.server_close()
+
+
+class Benchmark:
+    """Runs generate_tags.py against the fakes for each configuration."""
+
+    def __init__(
+        self,
+        entries: int,
+        latency: float,
+        latency_sigma: float,
+        failure_rate: float,
+        noise: bool,
+        api_latency_ms: float,
+        tagger_args: List[str],
+        timeout: int,
+        keep: bool = False,
+    ):
+        self.entries = entries
+        self.tagger_args = tagger_args
+        self.timeout = timeout
+        self.keep = keep
+        self.workdir = Path(tempfile.mkdtemp(prefix="trail-bench-"))
+        self.api = StandInAPI(entries, api_latency_ms)
+
+        bindir = self.workdir / "bin"
+        bindir.mkdir()
+        fake = bindir / "opencode"
+        fake.write_text(FAKE_OPENCODE.format(python=sys.executable))
+        fake.chmod(0o755)
+
+        self.env = dict(os.environ)
+        self.env.update({
+            "PATH": f"{bindir}{os.pathsep}{os.environ.get('PATH', '')}",
+            "TRAIL_API_KEY": "bench",
+            "BENCH_LATENCY": str(latency),
+            "BENCH_LATENCY_SIGMA": str(latency_sigma),
+            "BENCH_MAX_LATENCY": str(MAX_FAKE_LATENCY),
+            "BENCH_FAILURE_RATE": str(failure_rate),
+            "BENCH_NOISE": "1" if noise else "0",
+            "BENCH_TAG_POOL": json.dumps(TAG_POOL),
+        })
+
+    def run(self, concurrency: int, batch_size: int) -> Dict:
+        """Run one configuration and return its measurements."""
+        name = f"c{concurrency}-b{batch_size}"
+        self.api.reset()
+        call_log = self.workdir / f"{name}.calls.jsonl"
+        env = dict(self.env, BENCH_CALL_LOG=str(call_log))
+        cmd = [
+            sys.executable, str(GENERATE_TAGS),
+            "--api-url", self.api.url,
+            "--state-db", str(self.workdir / f"{name}.db"),
+            "--cache-file", str(self.workdir / f"{name}.json"),
+            "--limit", str(self.entries),
+            "--concurrency", str(concurrency),
+            "--batch-size", str(batch_size),
+        ] + self.tagger_args
+
+        with open(self.workdir / f"{name}.log", "w") as log:
+            start = time.monotonic()
+            proc = subprocess.Popen(cmd, stdout=log, stderr=subprocess.STDOUT, env=env)
+            timer = threading.Timer(self.timeout, proc.terminate)
+            timer.start()
+            try:
+                # wait4 gives the rusage of this run only (including the fake
+                # opencode processes it waited for)
+                _, status, usage = os.wait4(proc.pid, 0)
+            finally:
+                timer.cancel()
+            wall = time.monotonic() - start
+        proc.returncode = os.WEXITSTATUS(status) if os.WIFEXITED(status) else -1
+
+        calls = []
+        if call_log.exists():
+            calls = [json.loads(line) for line in call_log.read_text().splitlines() if line]
+        fake_cpu = sum(call["cpu"] for call in calls)
+        cpu = max(0.0, usage.ru_utime + usage.ru_stime - fake_cpu)
+        # ru_maxrss is KiB on Linux and bytes on macOS
+        rss_mb = usage.ru_maxrss / (1024 * 1024 if sys.platform == "darwin" else 1024)
+
+        with self.api.lock:
+            tagged = len(self.api.tagged)
+            api_requests = self.api.requests
+        return {
+            "config": name,
+            "concurrency": concurrency,
+            "batch_size": batch_size,
+            "exit_code": proc.returncode,
+            "entries": tagged,
+            "seconds": round(wall, 2),
+            "entries_per_min": round(tagged / wall * 60, 1) if wall > 0 else 0.0,
+            "llm_calls": len(calls),
+            "llm_failures": sum(1 for call in calls if not call["ok"]),
+            "api_requests": api_requests,
+            "cpu_seconds": round(cpu, 2),
+            "cpu_ms_per_entry": round(cpu * 1000 / tagged, 1) if tagged else None,
+            "peak_rss_mb": round(rss_mb, 1),
+        }
+
+    def close(self) -> None:
+        self.api.stop()
+        if self.keep:
+            print(f"📁 Logs and state kept in {self.workdir}")
+        else:
+            shutil.rmtree(self.workdir, ignore_errors=True)
+
+
+def git_commit() -> Optional[str]:
+    """Short hash of the checked-out commit (with a + when the tree is dirty)."""
+    try:
+        root = Path(__file__).parent
+        commit = subprocess.check_output(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=root, stderr=subprocess.DEVNULL, text=True
+        ).strip()
+        dirty = subprocess.call(["git", "diff", "--quiet", "HEAD", "--", "."], cwd=root) != 0
+        return commit + ("+" if dirty else "")
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def parse_list(value: str) -> List[int]:
+    try:
+        values = [int(v) for v in value.split(",") if v.strip()]
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"expected comma-separated integers, got {value!r}")
+    if not values or min(values) < 1:
+        raise argparse.ArgumentTypeError(f"expected positive integers, got {value!r}")
+    return values
+
+
+def print_results(results: List[Dict], baseline: Optional[Dict[str, Dict]] = None) -> None:
+    """Print one row per configuration, with the change against a baseline run."""
+    print()
+    print(f"{'config':<10} {'entries':>7} {'time':>8} {'entries/min':>12} {'calls':>6} "
+          f"{'fail':>5} {'cpu s':>7} {'cpu ms/entry':>13} {'peak rss':>9}")
+    print("-" * 84)
+    for r in results:
+        per_entry = f"{r['cpu_ms_per_entry']:.1f}" if r["cpu_ms_per_entry"] is not None else "-"
+        line = (
+            f"{r['config']:<10} {r['entries']:>7} {r['seconds']:>7.1f}s {r['entries_per_min']:>12.1f} "
+            f"{r['llm_calls']:>6} {r['llm_failures']:>5} {r['cpu_seconds']:>7.2f} {per_entry:>13} "
+            f"{r['peak_rss_mb']:>7.1f}MB"
+        )
+        before = (baseline or {}).get(r["config"])
+        if before and before["entries_per_min"]:
+            change = (r["entries_per_min"] / before["entries_per_min"] - 1) * 100
+            line += f"  ({change:+.1f}% vs {before['entries_per_min']:.1f}/min)"
+        if r["exit_code"] != 0:
+            line += f"  ⚠️ exit {r['exit_code']}"
+        print(line)
+
+
+def main():
+    """Main entry point."""
+    parser = argparse.ArgumentParser(
+        description="Benchmark generate_tags.py against a fake opencode and a local API stand-in",
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+        epilog="""
+Examples:
+  # Default matrix: concurrency 1,4,8 x batch size 1,5 over 200 entries
+  uv run bench_tags.py
+
+  # Raw pipeline throughput without the adaptive pacer's ramp-up
+  uv run bench_tags.py --tagger-args "--delay-ms 0"
+
+  # Compare two commits
+  uv run bench_tags.py --output before.json
+  git checkout my-branch && uv run bench_tags.py --compare before.json
+        """,
+    )
+
+    parser.add_argument(
+        "--entries",
+        type=int,
+        default=DEFAULT_ENTRIES,
+        help=f"Synthetic entries served by the stand-in API (default: {DEFAULT_ENTRIES})",
+    )
+
+    parser.add_argument(
+        "--concurrency",
+        type=parse_list,
+        default=parse_list(DEFAULT_CONCURRENCY),
+        help=f"Comma-separated --concurrency values to run (default: {DEFAULT_CONCURRENCY})",
+    )
+
+    parser.add_argument(
+        "--batch-size",
+        type=parse_list,
+        default=parse_list(DEFAULT_BATCH_SIZE),
+        help=f"Comma-separated --batch-size values to run (default: {DEFAULT_BATCH_SIZE})",
+    )
+
+    parser.add_argument(
+        "--latency",
+        type=float,
+        default=DEFAULT_LATENCY,
+        help=f"Median fake opencode latency in seconds (default: {DEFAULT_LATENCY})",
+    )
+
+    parser.add_argument(
+        "--latency-sigma",
+        type=float,
+        default=DEFAULT_LATENCY_SIGMA,
+        help="Log-normal sigma of the fake latency; larger means a heavier tail, 0 a fixed "
+             f"latency (default: {DEFAULT_LATENCY_SIGMA})",
+    )
+
+    parser.add_argument(
+        "--failure-rate",
+        type=float,
+        default=DEFAULT_FAILURE_RATE,
+        help=f"Fraction of fake opencode calls that exit non-zero (default: {DEFAULT_FAILURE_RATE})",
+    )
+
+    parser.add_argument(
+        "--no-noise",
+        action="store_true",
+        help="Print only the answer (by default the fake adds ANSI codes and echoes the prompt)",
+    )
+
+    parser.add_argument(
+        "--api-latency-ms",
+        type=float,
+        default=0.0,
+        help="Added latency for every stand-in API request (default: 0)",
+    )
+
+    parser.add_argument(
+        "--tagger-args",
+        default="",
+        help='Extra arguments passed to every generate_tags.py run, e.g. "--delay-ms 0 --hedge"',
+    )
+
+    parser.add_argument(
+        "--timeout",
+        type=int,
+        default=DEFAULT_RUN_TIMEOUT,
+        help=f"Seconds before a configuration is stopped (default: {DEFAULT_RUN_TIMEOUT})",
+    )
+
+    parser.add_argument(
+        "--output",
+        help="Save the results (with the git commit) as JSON",
+    )
+
+    parser.add_argument(
+        "--compare",
+        help="Results JSON from an earlier --output run to compare against",
+    )
+
+    parser.add_argument(
+        "--keep",
+        action="store_true",
+        help="Keep the per-run logs, call logs and state databases",
+    )
+
+    args = parser.parse_args()
+
+    baseline = None
+    if args.compare:
+        try:
+            with open(args.compare, "r") as f:
+                saved = json.load(f)
+        except (OSError, ValueError) as e:
+            print(f"❌ Error: could not read {args.compare}: {e}")
+            sys.exit(1)
+        baseline = {r["config"]: r for r in saved.get("results", [])}
+        print(f"📎 Comparing against {args.compare} (commit {saved.get('commit') or 'unknown'})")
+
+    bench = Benchmark(
+        entries=args.entries,
+        latency=args.latency,
+        latency_sigma=args.latency_sigma,
+        failure_rate=args.failure_rate,
+        noise=not args.no_noise,
+        api_latency_ms=args.api_latency_ms,
+        tagger_args=shlex.split(args.tagger_args),
+        timeout=args.timeout,
+        keep=args.keep,
+    )
+    bench.api.start()
+
+    commit = git_commit()
+    print("⏱  Trail Tag Generator Benchmark")
+    print(f"   Commit:         {commit or '(unknown)'}")
+    print(f"   Entries:        {args.entries}")
+    print(f"   Fake latency:   {args.latency}s median, sigma {args.latency_sigma}")
+    print(f"   Failure rate:   {args.failure_rate:.0%}")
+    print(f"   Tagger args:    {args.tagger_args or '(none)'}")
+    print()
+
+    results = []
+    try:
+        for concurrency in args.concurrency:
+            for batch_size in args.batch_size:
+                print(f"▶️  concurrency={concurrency} batch-size={batch_size} ...", flush=True)
+                result = bench.run(concurrency, batch_size)
+                results.append(result)
+                print(f"   {result['entries']} entries in {result['seconds']:.1f}s "
+                      f"({result['entries_per_min']:.1f}/min)")
+    except KeyboardInterrupt:
+        print("\n⚠️  Interrupted -- reporting finished configurations")
+    finally:
+        bench.close()
+
+    print_results(results, baseline)
+
+    if args.output:
+        report = {
+            "commit": commit,
+            "created_at": datetime.now().isoformat(),
+            "settings": {
+                "entries": args.entries,
+                "latency": args.latency,
+                "latency_sigma": args.latency_sigma,
+                "failure_rate": args.failure_rate,
+                "noise": not args.no_noise,
+                "api_latency_ms": args.api_latency_ms,
+                "tagger_args": args.tagger_args,
+            },
+            "results": results,
+        }
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+        print(f"\n💾 Results saved to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
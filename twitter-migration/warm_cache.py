@@ -0,0 +1,621 @@
+#!/usr/bin/env -S uv run --script
+# /// script
+# requires-python = ">=3.7"
+# dependencies = [
+#     "requests>=2.31.0",
+#     "urllib3>=2.0.0",
+#     "pyyaml>=6.0.0",
+# ]
+# ///
+"""
+Trail Post-Import Cache Warmer
+
+Pre-requests the derived resources of freshly imported entries so the first
+real visitors don't pay for cold caches on the backend.
+
+Features:
+- Reads the importer's ID mapping (cache file or twitter_trail_id_mapping.json)
+  or any list of entry hash IDs
+- Warms GET /api/preview-image/{hash_id}.png (social preview cards)
+- Warms GET /api/image-proxy/{encoded}?w=600 for external link preview images
+- Bounded concurrency with a separate rate limit per endpoint
+- Skips items already warmed, based on a local record file
+- Reports cache-fill throughput (items/s, MB/s, proxy HIT/MISS)
+
+Usage:
+    uv run warm_cache.py --api-key YOUR_API_KEY --mapping-file .migration_cache/cache.json
+    uv run warm_cache.py --api-key YOUR_API_KEY --entry-ids ABC123,DEF456
+"""
+
+import argparse
+import base64
+import json
+import os
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from datetime import datetime
+from pathlib import Path
+from typing import Dict, List, Optional, Set, Tuple
+from urllib.parse import urlparse
+
+import requests
+import yaml
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+# Constants
+RECORD_VERSION = 1
+DEFAULT_CONCURRENCY = 4
+# /api/preview-image is rate limited to 60 req/min per client on the backend
+DEFAULT_PREVIEW_RATE = 1.0
+DEFAULT_PROXY_RATE = 5.0
+# Matches the default width used by getProxiedImageUrl() in card-template.js
+DEFAULT_PROXY_WIDTH = 600
+OWN_DOMAINS = {"trail.services.kibotu.net", "trail.kibotu.net", "localhost", "127.0.0.1"}
+
+
+def get_base_url_from_secrets() -> Optional[str]:
+    """Try to read base_url from backend/secrets.yml."""
+    possible_paths = [
+        Path(__file__).parent.parent / "backend" / "secrets.yml",
+        Path(__file__).parent / ".." / "backend" / "secrets.yml",
+        Path("../backend/secrets.yml"),
+    ]
+
+    for secrets_path in possible_paths:
+        if secrets_path.exists():
+            try:
+                with open(secrets_path, "r") as f:
+                    config = yaml.safe_load(f)
+                    base_url = config.get("app", {}).get("base_url")
+                    if base_url:
+                        return f"{base_url}/api"
+            except Exception:
+                pass
+    return None
+
+
+def encode_proxy_url(url: str) -> str:
+    """URL-safe base64 without padding, same as ImageProxyService::encodeUrl()."""
+    encoded = base64.urlsafe_b64encode(url.encode("utf-8")).decode("ascii")
+    return encoded.rstrip("=")
+
+
+class RateLimiter:
+    """Thread-safe limiter that spaces request starts evenly."""
+
+    def __init__(self, rate_per_second: float):
+        self.interval = 1.0 / rate_per_second if rate_per_second > 0 else 0.0
+        self.next_slot = 0.0
+        self.lock = threading.Lock()
+
+    def wait(self) -> None:
+        """Block until the caller may start its next request."""
+        if not self.interval:
+            return
+        with self.lock:
+            now = time.monotonic()
+            slot = max(now, self.next_slot)
+            self.next_slot = slot + self.interval
+        delay = slot - now
+        if delay > 0:
+            time.sleep(delay)
+
+
+class CacheWarmer:
+    """Warm preview images and proxied media for a set of Trail entries."""
+
+    def __init__(
+        self,
+        api_key: str,
+        api_url: Optional[str] = None,
+        record_file: str = ".cache_warm_record.json",
+        concurrency: int = DEFAULT_CONCURRENCY,
+        preview_rate: float = DEFAULT_PREVIEW_RATE,
+        proxy_rate: float = DEFAULT_PROXY_RATE,
+        proxy_width: int = DEFAULT_PROXY_WIDTH,
+        force: bool = False,
+        dry_run: bool = False,
+        verbose: bool = False,
+    ):
+        self.api_key = api_key
+        self.api_url = (
+            api_url
+            or os.environ.get("TRAIL_API_URL")
+            or get_base_url_from_secrets()
+            or "http://localhost/api"
+        )
+        self.record_file = record_file
+        self.concurrency = max(1, concurrency)
+        self.proxy_width = proxy_width
+        self.force = force
+        self.dry_run = dry_run
+        self.verbose = verbose
+
+        self.limiters = {
+            "preview": RateLimiter(preview_rate),
+            "proxy": RateLimiter(proxy_rate),
+        }
+
+        # Statistics
+        self.stats = {
+            "entries": 0,
+            "targets": 0,
+            "skipped_warm": 0,
+            "warmed": 0,
+            "failed": 0,
+            "bytes": 0,
+            "proxy_hit": 0,
+            "proxy_miss": 0,
+            "by_endpoint": {"preview": 0, "proxy": 0},
+            "start_time": None,
+            "end_time": None,
+        }
+        self.lock = threading.Lock()
+
+        # Record: target key -> ISO timestamp of the last successful warm-up
+        self.warmed: Dict[str, str] = {}
+        self._load_record()
+
+        # Sized to the worker pool so keep-alive connections are reused
+        self.session = self._create_session()
+
+    def _create_session(self) -> requests.Session:
+        """Create HTTP session with retry logic."""
+        session = requests.Session()
+        retry = Retry(
+            total=3,
+            backoff_factor=1,
+            status_forcelist=[429, 500, 502, 503, 504],
+            allowed_methods=["GET"],
+        )
+        adapter = HTTPAdapter(
+            max_retries=retry,
+            pool_connections=self.concurrency,
+            pool_maxsize=self.concurrency,
+        )
+        session.mount("http://", adapter)
+        session.mount("https://", adapter)
+        session.headers.update({
+            "Authorization": f"Bearer {self.api_key}",
+            "User-Agent": "Trail-Cache-Warmer/1.0 (Admin Tool)",
+        })
+        return session
+
+    def _load_record(self) -> None:
+        """Load the warm-up record from disk."""
+        path = Path(self.record_file)
+        if not path.exists():
+            return
+
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+            if data.get("version") != RECORD_VERSION:
+                print("⚠️  Record version mismatch, starting fresh")
+                return
+            self.warmed = data.get("warmed", {})
+            print(f"📦 Loaded record: {len(self.warmed)} items already warm")
+        except (json.JSONDecodeError, KeyError) as e:
+            print(f"⚠️  Warning: corrupt record file, starting fresh ({e})")
+
+    def _save_record(self) -> None:
+        """Atomically write the warm-up record to disk."""
+        path = Path(self.record_file)
+        tmp_path = path.with_suffix(".tmp")
+
+        with self.lock:
+            data = {
+                "version": RECORD_VERSION,
+                "warmed": dict(self.warmed),
+                "last_updated": datetime.now().isoformat(),
+            }
+
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(data, f, indent=2)
+
+        tmp_path.rename(path)
+
+    @staticmethod
+    def load_id_mapping(mapping_file: str) -> List[int]:
+        """
+        Read numeric Trail IDs from the importer's output.
+
+        Accepts both the --cache-file format ({"migrated_tweets": {...}})
+        and the plain twitter_trail_id_mapping.json mapping.
+        """
+        with open(mapping_file, "r", encoding="utf-8") as f:
+            data = json.load(f)
+
+        mapping = data.get("migrated_tweets", data) if isinstance(data, dict) else {}
+        ids = []
+        for trail_id in mapping.values():
+            # Dry-run imports record -1 as a placeholder ID
+            if isinstance(trail_id, int) and trail_id > 0:
+                ids.append(trail_id)
+        return ids
+
+    def _fetch_profile_nickname(self) -> str:
+        """Resolve the nickname of the API key owner."""
+        resp = self.session.get(f"{self.api_url}/profile", timeout=15)
+        resp.raise_for_status()
+        nickname = resp.json().get("nickname")
+        if not nickname:
+            raise RuntimeError("Profile response has no nickname")
+        return nickname
+
+    def resolve_numeric_ids(self, numeric_ids: List[int]) -> List[Dict]:
+        """
+        Map numeric IDs to entries by paging the key owner's feed.
+
+        The hash ID salt lives on the server, so imported entries can only be
+        matched up through the listing. Paging stops once every ID is found.
+        """
+        wanted: Set[int] = set(numeric_ids)
+        found: List[Dict] = []
+        nickname = self._fetch_profile_nickname()
+        cursor = None
+        page = 0
+
+        print(f"🔎 Resolving {len(wanted)} imported IDs via @{nickname}'s entries...")
+
+        while wanted:
+            page += 1
+            params = {"limit": 100}
+            if cursor:
+                params["before"] = cursor
+
+            resp = self.session.get(
+                f"{self.api_url}/users/{nickname}/entries",
+                params=params,
+                timeout=30,
+            )
+            resp.raise_for_status()
+            data = resp.json()
+
+            for entry in data.get("entries", []):
+                if entry.get("id") in wanted:
+                    wanted.discard(entry["id"])
+                    found.append(entry)
+
+            if self.verbose:
+                print(f"  Page {page}: {len(found)} resolved, {len(wanted)} remaining")
+
+            if not data.get("has_more", False):
+                break
+            cursor = data.get("next_cursor")
+
+        if wanted:
+            print(f"⚠️  {len(wanted)} IDs not found (deleted or not owned by this key)")
+        return found
+
+    def fetch_entries(self, hash_ids: List[str]) -> List[Dict]:
+        """Fetch entries by hash ID concurrently."""
+        entries = []
+
+        def fetch(hash_id: str) -> Optional[Dict]:
+            try:
+                resp = self.session.get(f"{self.api_url}/entries/{hash_id}", timeout=30)
+                resp.raise_for_status()
+                return resp.json()
+            except requests.exceptions.RequestException as e:
+                print(f"  ⚠️  Could not fetch {hash_id}: {e}")
+                return None
+
+        with ThreadPoolExecutor(max_workers=self.concurrency) as pool:
+            for entry in pool.map(fetch, hash_ids):
+                if entry:
+                    entries.append(entry)
+        return entries
+
+    def build_targets(self, entries: List[Dict]) -> List[Tuple[str, str, str]]:
+        """Return (endpoint, record_key, url) tuples for every derived resource."""
+        targets = []
+        for entry in entries:
+            hash_id = entry.get("hash_id")
+            if hash_id:
+                targets.append((
+                    "preview",
+                    f"preview:{hash_id}",
+                    f"{self.api_url}/preview-image/{hash_id}.png",
+                ))
+
+            image = entry.get("preview_image")
+            if image and not image.startswith("data:"):
+                host = urlparse(image).hostname or ""
+                if host and host not in OWN_DOMAINS:
+                    encoded = encode_proxy_url(image)
+                    targets.append((
+                        "proxy",
+                        f"proxy:{encoded}?w={self.proxy_width}",
+                        f"{self.api_url}/image-proxy/{encoded}?w={self.proxy_width}",
+                    ))
+        return targets
+
+    def _warm_one(self, endpoint: str, key: str, url: str) -> bool:
+        """Request a single resource and drain the body so the server finishes it."""
+        self.limiters[endpoint].wait()
+        try:
+            resp = self.session.get(url, timeout=60, stream=True)
+            size = 0
+            for chunk in resp.iter_content(chunk_size=65536):
+                size += len(chunk)
+            resp.close()
+            if resp.status_code not in (200, 304):
+                if self.verbose:
+                    print(f"  ❌ {resp.status_code} {url}")
+                return False
+        except requests.exceptions.RequestException as e:
+            if self.verbose:
+                print(f"  ❌ {url}: {e}")
+            return False
+
+        with self.lock:
+            self.stats["bytes"] += size
+            self.stats["by_endpoint"][endpoint] += 1
+            proxy_state = resp.headers.get("X-Image-Proxy")
+            if proxy_state == "HIT":
+                self.stats["proxy_hit"] += 1
+            elif proxy_state == "MISS":
+                self.stats["proxy_miss"] += 1
+            self.warmed[key] = datetime.now().isoformat()
+        return True
+
+    def warm(self, targets: List[Tuple[str, str, str]]) -> None:
+        """Warm all targets with bounded concurrency."""
+        pending = []
+        for target in targets:
+            if not self.force and target[1] in self.warmed:
+                self.stats["skipped_warm"] += 1
+                continue
+            pending.append(target)
+
+        print(f"📋 To warm: {len(pending)}")
+        print(f"⏭️  Skipped (already warm): {self.stats['skipped_warm']}")
+        print()
+
+        if self.dry_run:
+            for endpoint, _, url in pending[:20]:
+                print(f"  [DRY RUN] {endpoint:8} {url}")
+            if len(pending) > 20:
+                print(f"  ... and {len(pending) - 20} more")
+            return
+
+        self.stats["start_time"] = datetime.now()
+        done = 0
+
+        with ThreadPoolExecutor(max_workers=self.concurrency) as pool:
+            futures = [pool.submit(self._warm_one, *target) for target in pending]
+            for future in as_completed(futures):
+                done += 1
+                if future.result():
+                    self.stats["warmed"] += 1
+                else:
+                    self.stats["failed"] += 1
+
+                if done % 25 == 0 or done == len(pending):
+                    elapsed = (datetime.now() - self.stats["start_time"]).total_seconds()
+                    rate = done / elapsed if elapsed > 0 else 0.0
+                    print(f"  [{done}/{len(pending)}] {rate:.1f} items/s")
+                    self._save_record()
+
+        self.stats["end_time"] = datetime.now()
+        self._save_record()
+
+    def run(
+        self,
+        numeric_ids: Optional[List[int]] = None,
+        hash_ids: Optional[List[str]] = None,
+    ) -> None:
+        """Resolve entries, build targets and warm them."""
+        print("🔥 Trail Cache Warmer")
+        print(f"   API:          {self.api_url}")
+        print(f"   Record:       {self.record_file}")
+        print(f"   Concurrency:  {self.concurrency}")
+        print(f"   Dry run:      {self.dry_run}")
+        print()
+
+        entries: List[Dict] = []
+        if numeric_ids:
+            entries.extend(self.resolve_numeric_ids(numeric_ids))
+        if hash_ids:
+            print(f"📥 Fetching {len(hash_ids)} entries by hash ID...")
+            entries.extend(self.fetch_entries(hash_ids))
+
+        self.stats["entries"] = len(entries)
+        targets = self.build_targets(entries)
+        self.stats["targets"] = len(targets)
+        print(f"✅ {len(entries)} entries → {len(targets)} derived resources")
+
+        self.warm(targets)
+        self.print_summary()
+
+    def print_summary(self) -> None:
+        """Print warm-up summary and cache-fill throughput."""
+        if not self.stats["start_time"] or not self.stats["end_time"]:
+            return
+
+        duration = (self.stats["end_time"] - self.stats["start_time"]).total_seconds()
+        megabytes = self.stats["bytes"] / (1024 * 1024)
+
+        print("\n" + "=" * 60)
+        print("📊 SUMMARY")
+        print("=" * 60)
+        print(f"Entries:                    {self.stats['entries']}")
+        print(f"Warmed:                     {self.stats['warmed']} ✅")
+        print(f"  - Preview images:         {self.stats['by_endpoint']['preview']}")
+        print(f"  - Proxied images:         {self.stats['by_endpoint']['proxy']}")
+        print(f"Failed:                     {self.stats['failed']} ❌")
+        print(f"Skipped (already warm):     {self.stats['skipped_warm']} ⏭️")
+        if self.stats["proxy_hit"] or self.stats["proxy_miss"]:
+            print(f"Proxy HIT/MISS:             {self.stats['proxy_hit']}/{self.stats['proxy_miss']}")
+        print("-" * 60)
+        print(f"Duration:                   {duration:.1f} seconds")
+        print(f"Transferred:                {megabytes:.1f} MB")
+        if duration > 0:
+            print(f"Throughput:                 {self.stats['warmed'] / duration:.2f} items/s, "
+                  f"{megabytes / duration:.2f} MB/s")
+        print("=" * 60)
+
+
+def main():
+    """Main entry point."""
+    parser = argparse.ArgumentParser(
+        description="Warm Trail preview images and proxied media after an import",
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+        epilog="""
+Examples:
+  # Warm everything the importer created (cache file from migrate.sh)
+  uv run warm_cache.py --api-key YOUR_API_KEY --mapping-file .migration_cache/twitter-backup.json
+
+  # Warm specific entries by hash ID
+  uv run warm_cache.py --api-key YOUR_API_KEY --entry-ids ABC123,DEF456
+
+  # Hash IDs from a file (one per line)
+  uv run warm_cache.py --api-key YOUR_API_KEY --entry-ids-file ids.txt
+
+  # Faster proxy warming, re-warm items already in the record
+  uv run warm_cache.py --api-key YOUR_API_KEY --mapping-file map.json --proxy-rate 10 --force
+        """,
+    )
+
+    parser.add_argument(
+        "--api-key",
+        help="API key for Trail API authentication (or set TRAIL_API_KEY env var)",
+    )
+
+    default_api_url = (
+        os.environ.get("TRAIL_API_URL")
+        or get_base_url_from_secrets()
+        or "http://localhost/api"
+    )
+
+    parser.add_argument(
+        "--api-url",
+        default=default_api_url,
+        help=f"Trail API base URL (default: {default_api_url})",
+    )
+
+    parser.add_argument(
+        "--mapping-file",
+        help="Importer ID mapping (cache file or twitter_trail_id_mapping.json)",
+    )
+
+    parser.add_argument(
+        "--entry-ids",
+        help="Comma-separated list of entry hash IDs to warm",
+    )
+
+    parser.add_argument(
+        "--entry-ids-file",
+        help="File with one entry hash ID per line",
+    )
+
+    parser.add_argument(
+        "--record-file",
+        default=".cache_warm_record.json",
+        help="Path to the record of already-warm items (default: .cache_warm_record.json)",
+    )
+
+    parser.add_argument(
+        "--concurrency",
+        type=int,
+        default=DEFAULT_CONCURRENCY,
+        help=f"Maximum parallel requests (default: {DEFAULT_CONCURRENCY})",
+    )
+
+    parser.add_argument(
+        "--preview-rate",
+        type=float,
+        default=DEFAULT_PREVIEW_RATE,
+        help=f"Max preview-image requests per second (default: {DEFAULT_PREVIEW_RATE})",
+    )
+
+    parser.add_argument(
+        "--proxy-rate",
+        type=float,
+        default=DEFAULT_PROXY_RATE,
+        help=f"Max image-proxy requests per second (default: {DEFAULT_PROXY_RATE})",
+    )
+
+    parser.add_argument(
+        "--proxy-width",
+        type=int,
+        default=DEFAULT_PROXY_WIDTH,
+        help=f"Width requested from the image proxy (default: {DEFAULT_PROXY_WIDTH})",
+    )
+
+    parser.add_argument(
+        "--force",
+        action="store_true",
+        help="Re-warm items even if the record says they are already warm",
+    )
+
+    parser.add_argument(
+        "--dry-run",
+        action="store_true",
+        help="Resolve entries and list targets without requesting them",
+    )
+
+    parser.add_argument(
+        "-v",
+        "--verbose",
+        action="store_true",
+        help="Enable verbose mode (show paging progress and failures)",
+    )
+
+    args = parser.parse_args()
+
+    api_key = args.api_key or os.environ.get("TRAIL_API_KEY")
+    if not api_key:
+        print("❌ Error: API key required. Provide via --api-key or TRAIL_API_KEY env var")
+        sys.exit(1)
+
+    numeric_ids: List[int] = []
+    if args.mapping_file:
+        if not Path(args.mapping_file).exists():
+            print(f"❌ Error: Mapping file not found: {args.mapping_file}")
+            sys.exit(1)
+        numeric_ids = CacheWarmer.load_id_mapping(args.mapping_file)
+
+    hash_ids: List[str] = []
+    if args.entry_ids:
+        hash_ids.extend(i.strip() for i in args.entry_ids.split(",") if i.strip())
+    if args.entry_ids_file:
+        with open(args.entry_ids_file, "r", encoding="utf-8") as f:
+            hash_ids.extend(line.strip() for line in f if line.strip())
+
+    if not numeric_ids and not hash_ids:
+        print("❌ Error: nothing to warm. Provide --mapping-file, --entry-ids or --entry-ids-file")
+        sys.exit(1)
+
+    warmer = CacheWarmer(
+        api_key=api_key,
+        api_url=args.api_url,
+        record_file=args.record_file,
+        concurrency=args.concurrency,
+        preview_rate=args.preview_rate,
+        proxy_rate=args.proxy_rate,
+        proxy_width=args.proxy_width,
+        force=args.force,
+        dry_run=args.dry_run,
+        verbose=args.verbose,
+    )
+
+    try:
+        warmer.run(numeric_ids=numeric_ids, hash_ids=hash_ids)
+    except KeyboardInterrupt:
+        print("\n\n⚠️  Interrupted -- saving record and exiting...")
+        warmer._save_record()
+        sys.exit(1)
+    except Exception as e:
+        print(f"\n❌ Fatal error: {e}")
+        import traceback
+        traceback.print_exc()
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()